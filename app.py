@@ -1,180 +1,656 @@
 import streamlit as st
-import requests
+import fastjsonschema
+import httpx
+import asyncio
+import collections
+import contextlib
+import copy
+import gzip
 import json
+import hashlib
+import html
+import pathlib
+import re
+import threading
+import time
+import yaml
 
-# --- Page Configuration ---
-st.set_page_config(
-    page_title="10D Stores - AI Database Action Analyzer",
-    page_icon="🏪",
-    layout="wide"
-)
+try:
+    from orjson import dumps as _json_dumps, loads as _json_loads
+except ImportError:  # orjson is an optional speedup; fall back to the stdlib
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+# --- Prompt Configuration ---
+# App-specific details (name, description, schema, keywords) live in schemas/*.yaml;
+# the output contract stays here since the validators below depend on it.
+_SYSTEM_PROMPT_TEMPLATE = """
+You are an expert Firestore database analyst for the {app_name} application. Your task is to analyze a user-described action and determine its impact on the provided Firestore collections.
+
+{app_description}
+You MUST respond with ONLY a valid JSON object following this exact structure. Do not include markdown, comments, or any other text.
+{{
+  "description": "A detailed paragraph summarizing the Firestore operations. Explain what data is being read for validation or context, and what new data is being written or which fields are being updated. Be specific about the flow of operations and how it relates to the {app_name} business logic. IMPORTANT: When you mention a field name from the schema, you MUST wrap it in double asterisks. For example: '...checks the **isActive** field...' or '...updates the **favoritedBusinessIds** array...'.",
+  "impact": [
+    {{
+      "table": "CollectionName",
+      "operation": "READ" | "WRITE" | "DELETE",
+      "fields": ["field1", "field2"],
+      "reason": "A concise explanation of why this operation occurs in the context of {app_name}."
+    }}
+  ]
+}}
+"""
+
+_SCHEMAS_DIR = pathlib.Path(__file__).parent / "schemas"
+_DEFAULT_SCHEMA = "tend_stores"
 
-# --- API Call Function ---
-def analyze_action_with_ai(user_query: str):
+def available_schemas() -> list:
+    """Lists the schema names that have a file in schemas/."""
+    return sorted(path.stem for path in _SCHEMAS_DIR.glob("*.yaml"))
+
+@st.cache_resource(show_spinner=False)
+def _load_schema_file(name: str, mtime: float) -> dict:
     """
-    Calls the Gemini API to analyze the user's action against the DB schema.
+    Parses a schema file and derives its prompt pieces.
+
+    `mtime` is only part of the cache key, so edits to the file are picked up.
     """
-    # For deployment, it's crucial to use st.secrets for your API key
-    api_key = st.secrets.get("GEMINI_API_KEY", "") 
-    if not api_key:
-        st.error("GEMINI_API_KEY is not set in Streamlit secrets. The app cannot function without it. Please add it to your .streamlit/secrets.toml file.", icon="🚨")
-        return None
+    config = yaml.safe_load((_SCHEMAS_DIR / f"{name}.yaml").read_text(encoding="utf-8"))
+    system_prompt = _SYSTEM_PROMPT_TEMPLATE.format(app_name=config["app_name"], app_description=config["app_description"])
+    return {
+        **config,
+        "name": name,
+        "system_prompt": system_prompt,
+        # The schema rides along with the system prompt so the model can actually see it.
+        "system_instruction": {"parts": [{"text": system_prompt + config["schema"]}]},
+        "keywords": frozenset(config["keywords"]),
+        # Passed to the cached API helpers as a key component, so any schema or
+        # prompt edit automatically invalidates their entries.
+        "version": hashlib.blake2b((config["schema"] + system_prompt).encode(), digest_size=8).hexdigest(),
+    }
+
+def load_schema(name: str) -> dict:
+    """Loads schemas/<name>.yaml, reparsing it only when the file changes."""
+    return _load_schema_file(name, (_SCHEMAS_DIR / f"{name}.yaml").stat().st_mtime)
+
+# Static parts of the request payload, built once rather than on every call.
+# Output is capped well above the largest plausible analysis of these collections,
+# thinking is disabled, and a low temperature keeps repeat answers (and cache hits)
+# consistent; generation time scales with output tokens.
+_GEN_CFG = {
+    "responseMimeType": "application/json",
+    # Constrains decoding to the analysis contract (the same one _validate_analysis
+    # checks), with the description first so it can be streamed before the impacts.
+    "responseSchema": {
+        "type": "OBJECT",
+        "properties": {
+            "description": {"type": "STRING"},
+            "impact": {
+                "type": "ARRAY",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "table": {"type": "STRING"},
+                        "operation": {"type": "STRING", "enum": ["READ", "WRITE", "DELETE"]},
+                        "fields": {"type": "ARRAY", "items": {"type": "STRING"}},
+                        "reason": {"type": "STRING"},
+                    },
+                    "required": ["table", "operation", "fields", "reason"],
+                    "propertyOrdering": ["table", "operation", "fields", "reason"],
+                },
+            },
+        },
+        "required": ["description", "impact"],
+        "propertyOrdering": ["description", "impact"],
+    },
+    "maxOutputTokens": 1024,
+    "temperature": 0.1,
+    "thinkingConfig": {"thinkingBudget": 0},
+}
+
+_GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+
+# Finds the start of the description string in the streamed JSON response.
+_DESCRIPTION_KEY = re.compile(r'"description"\s*:\s*"')
+
+# Request bodies are small, highly repetitive JSON, so they're sent gzip-compressed.
+_REQUEST_HEADERS = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+
+def _request_headers() -> dict:
+    """
+    Returns the request headers, including the API key.
+
+    The key goes in a header rather than the query string, because httpx error
+    messages include the URL and those are shown to the user.
+    """
+    return {**_REQUEST_HEADERS, "x-goog-api-key": st.secrets.get("GEMINI_API_KEY", "")}
+
+# Every phase of a request is bounded so a hung connection can't pin a worker.
+_TIMEOUT = httpx.Timeout(connect=3.0, read=30.0, write=5.0, pool=5.0)
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_RETRIES = 2
+
+def _backoff(attempt: int) -> float:
+    """Seconds to wait before retrying after the given attempt."""
+    return min(2 ** attempt, 8)
+
+_NO_IMPACT_DESCRIPTION = "This action does not appear to touch the database schema."
+_WORD = re.compile(r"[a-z]+")
+
+# Response contracts, compiled once into validators so malformed replies fail
+# fast with a precise message instead of rendering "N/A" placeholders.
+_validate_response = fastjsonschema.compile({
+    "type": "object",
+    "required": ["candidates"],
+    "properties": {
+        "candidates": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["content"],
+                "properties": {
+                    "content": {
+                        "type": "object",
+                        "required": ["parts"],
+                        "properties": {
+                            "parts": {
+                                "type": "array",
+                                "minItems": 1,
+                                "items": {"type": "object", "required": ["text"], "properties": {"text": {"type": "string"}}},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+})
+_validate_analysis = fastjsonschema.compile({
+    "type": "object",
+    "required": ["description", "impact"],
+    "properties": {
+        "description": {"type": "string"},
+        "impact": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["table", "operation", "fields", "reason"],
+                "properties": {
+                    "table": {"type": "string"},
+                    "operation": {"enum": ["READ", "WRITE", "DELETE"]},
+                    "fields": {"type": "array", "items": {"type": "string"}},
+                    "reason": {"type": "string"},
+                },
+            },
+        },
+    },
+})
+
+# --- API Call Functions ---
+class ResponseFormatError(ValueError):
+    """Raised when the API response can't be turned into an analysis."""
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+@st.cache_resource
+def _http() -> httpx.Client:
+    """Shared HTTP/2 client so repeat calls reuse one pooled TLS connection."""
+    return httpx.Client(
+        timeout=_TIMEOUT,
+        transport=httpx.HTTPTransport(http2=True, retries=2, limits=httpx.Limits(max_connections=8)),
+    )
+
+def _post(url: str, body: bytes, stream: bool = False) -> httpx.Response:
+    """
+    POSTs a JSON body gzip-compressed, retrying rate limits and server errors.
 
-    api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={api_key}"
-
-    db_schema = """
-        10D Stores Firestore Database Schema:
-        
-        1. users (Document ID: userId)
-           - uid, email, displayName, photoUrl, userType, phoneNumber, isPhoneVerified
-           - createdAt, lastLoginAt, fcmTokens, isActive, favoritedBusinessIds
-        
-        2. businesses (Document ID: auto-generated)
-           - businessId, ownerId, businessName, description, logoUrl, coverImages
-           - category, contactInfo (phone, email), address (street, city, state, zipCode)
-           - geolocation, uniqueQrCodeId, verificationStatus, verificationDocs
-           - adminNotes, createdAt, lastUpdatedAt, isSuspended, suspensionReason
-        
-        3. business_public_profiles (Document ID: businessId)
-           - businessId, businessName, logoUrl, category, city, geolocation
-           - averageRating, reviewCount, activeOfferCount
-        
-        4. products (Document ID: auto-generated)
-           - productId, businessId, name, description, imageUrl, price
-           - productCategory, marginType, isActive, createdAt, lastUpdatedAt
-        
-        5. offers (Document ID: auto-generated)
-           - offerId, businessId, businessName, title, description
-           - discountType, discountValue, status, applicability (scope, targetProductIds, targetProductCategories, targetMarginTypes)
-           - conditions (minBillAmount, validFrom, validUntil, applicableDays, time)
-           - usageLimits (limitPerUser, totalLimit), usageStats (timesUsed)
-           - createdBy, createdAt
-        
-        6. redemptions (Document ID: auto-generated)
-           - redemptionId, userId, businessId, offerId, timestamp
-           - billDetails (amountBeforeDiscount, calculatedDiscount, amountAfterDiscount)
-           - offerSnapshot (title, discountType, discountValue)
-           - userDisplayName, businessName
-        
-        7. reviews (Document ID: auto-generated)
-           - reviewId, businessId, userId, redemptionId, rating, reviewText
-           - timestamp, ownerResponseText, ownerResponseTimestamp
-           - isHiddenByAdmin, moderationNotes
-        
-        8. platform_config (Document ID: "global_settings")
-           - businessCategories, minRequiredAppVersionCustomer, minRequiredAppVersionBusiness
-           - isForceUpdateRequired, maintenanceMode, supportContact
-           - termsAndConditionsUrl, privacyPolicyUrl
-    """
-
-    system_prompt = """
-        You are an expert Firestore database analyst for the 10D Stores application. Your task is to analyze a user-described action and determine its impact on the provided Firestore collections.
-        
-        The 10D Stores app is a discount/offer platform where:
-        - Users can browse businesses, view offers, redeem discounts, and leave reviews
-        - Business owners can create offers and manage their business profiles
-        - The system tracks redemptions, reviews, and user preferences
-        
-        You MUST respond with ONLY a valid JSON object following this exact structure. Do not include markdown, comments, or any other text.
-        {
-          "description": "A detailed paragraph summarizing the Firestore operations. Explain what data is being read for validation or context, and what new data is being written or which fields are being updated. Be specific about the flow of operations and how it relates to the 10D Stores business logic. IMPORTANT: When you mention a field name from the schema, you MUST wrap it in double asterisks. For example: '...checks the **isActive** field...' or '...updates the **favoritedBusinessIds** array...'.",
-          "impact": [
-            {
-              "table": "CollectionName",
-              "operation": "READ" | "WRITE" | "DELETE",
-              "fields": ["field1", "field2"],
-              "reason": "A concise explanation of why this operation occurs in the context of 10D Stores."
-            }
-          ]
-        }
+    With `stream=True` the caller is responsible for closing the response.
     """
+    request = _http().build_request("POST", url, content=gzip.compress(body), headers=_request_headers())
+    for attempt in range(_MAX_RETRIES + 1):
+        response = _http().send(request, stream=stream)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            return response
+        response.close()
+        time.sleep(_backoff(attempt))
 
+@st.cache_resource(ttl=3500, show_spinner=False)
+def _get_cached_content_name(schema_name: str, version: str):
+    """
+    Uploads the system instruction once as Gemini cached content and returns its name.
+
+    Returns None when the API rejects the cache (e.g. the prompt is below the model's
+    minimum cacheable size); callers then send the system instruction inline. The
+    server-side TTL is slightly longer than ours so we never reference an expired cache.
+    """
     payload = {
-        "contents": [{"parts": [{"text": user_query}]}],
-        "systemInstruction": {"parts": [{"text": system_prompt}]},
-        "generationConfig": {
-            "responseMimeType": "application/json",
-        }
+        "model": f"models/{_GEMINI_MODEL}",
+        "systemInstruction": load_schema(schema_name)["system_instruction"],
+        "ttl": "3600s",
     }
 
+    response = _post(f"{_API_BASE}/cachedContents", _json_dumps(payload))
+    if 400 <= response.status_code < 500 and response.status_code not in _RETRY_STATUSES:
+        return None
+    response.raise_for_status()
+    return _json_loads(response.content)["name"]
+
+def _check_finish_reason(candidate: dict, response):
+    """Raises a clear error when the model stopped at the output token limit."""
+    if candidate.get("finishReason") == "MAX_TOKENS":
+        raise ResponseFormatError("The AI's response was cut off at the output token limit.", response)
+
+def _stream_text(response):
+    """
+    Yields the text deltas from a streamGenerateContent SSE response.
+
+    Frames aren't validated individually, since some carry only metadata; the
+    assembled text is validated once the stream ends.
+    """
+    for line in response.iter_lines():
+        if not line.startswith("data:"):
+            continue
+        frame = _json_loads(line[len("data:"):])
+        candidate = frame.get("candidates", [{}])[0]
+        for part in candidate.get("content", {}).get("parts", []):
+            yield part.get("text", "")
+        _check_finish_reason(candidate, frame)
+
+def _description_deltas(chunks, buffer: list):
+    """
+    Yields the "description" value of the streamed JSON object as it arrives.
+
+    Every raw chunk is also appended to `buffer` so the full object can be
+    parsed once the stream ends.
+    """
+    raw = ""
+    pos = None  # Next unread character of the description string
+    done = False
+    for chunk in chunks:
+        buffer.append(chunk)
+        if done:
+            continue
+        raw += chunk
+        if pos is None:
+            match = _DESCRIPTION_KEY.search(raw)
+            if not match:
+                continue
+            pos = match.end()
+
+        end = pos
+        while end < len(raw):
+            if raw[end] == '"':
+                done = True
+                break
+            if raw[end] == "\\":
+                step = 2
+                if raw[end + 1:end + 2] == "u":
+                    step = 6
+                    # A high surrogate only decodes together with the low surrogate after it
+                    if "d800" <= raw[end + 2:end + 6].lower() <= "dbff":
+                        step = 12
+                if end + step > len(raw):
+                    break  # Escape sequence is split across chunks
+                end += step
+            else:
+                end += 1
+        if end > pos:
+            yield _json_loads(f'"{raw[pos:end]}"')
+            pos = end
+
+# Keyed on the cached content name, which changes with every _get_cached_content_name
+# refresh, so entries expire on the same schedule instead of piling up.
+@st.cache_resource(ttl=3500, show_spinner=False)
+def _payload_suffix(schema_name: str, version: str, cached_content) -> bytes:
+    """
+    Serializes the static part of the request body, without its opening brace.
+
+    Only the user query varies between requests, so everything else is encoded
+    once per schema and cached content name and appended to the per-query prefix
+    as bytes.
+    """
+    static = {"generationConfig": _GEN_CFG}
+    if cached_content:
+        static["cachedContent"] = cached_content
+    else:
+        static["systemInstruction"] = load_schema(schema_name)["system_instruction"]
+    return _json_dumps(static)[1:]
+
+def _build_body(user_query: str, schema_name: str, version: str) -> bytes:
+    """Builds the JSON generateContent request body for a single query."""
+    cached_content = _get_cached_content_name(schema_name, version)
+    suffix = _payload_suffix(schema_name, version, cached_content)
+    return b'{"contents":[{"parts":[{"text":' + _json_dumps(user_query) + b'}]}],' + suffix
+
+def _parse_analysis(json_text: str, response=None) -> dict:
+    """Parses the model's JSON reply, raising ResponseFormatError if it isn't usable."""
     try:
-        response = requests.post(api_url, json=payload, headers={"Content-Type": "application/json"})
-        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
-        result = response.json()
-        
-        json_text = result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
         if not json_text:
             raise ValueError("Received an empty or invalid response from the AI.")
-            
-        return json.loads(json_text)
-    except requests.exceptions.RequestException as e:
-        st.error(f"Network error calling the API: {e}")
-    except (ValueError, KeyError, IndexError) as e:
-        st.error(f"Error parsing the API response: {e}. The AI might have returned an unexpected format.")
-        st.json(result if 'result' in locals() else "No response object available.")
+
+        return _validate_analysis(_json_loads(json_text))
+    except ValueError as e:  # Includes fastjsonschema.JsonSchemaException
+        raise ResponseFormatError(str(e), json_text if response is None else response) from e
+
+_ANALYSIS_TTL = 24 * 60 * 60
+_ANALYSIS_MAX_ENTRIES = 512
+
+class _AnalysisStore:
+    """
+    Bounded, expiring map from (user_query, schema_name, version) to an analysis.
+
+    Entries are kept in insertion order, so the oldest one is evicted once the
+    store is full. Results are copied in and out, so callers can't mutate a
+    stored analysis.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self._ttl:
+                del self._entries[key]
+                return None
+            return copy.deepcopy(result)
+
+    def put(self, key: tuple, result: dict):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic(), copy.deepcopy(result))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+@st.cache_resource(show_spinner=False)
+def _analysis_store() -> _AnalysisStore:
+    """Per-query analysis cache shared by every session and by the single and batch paths."""
+    return _AnalysisStore(_ANALYSIS_TTL, _ANALYSIS_MAX_ENTRIES)
+
+def _cached_analysis(user_query: str, schema: dict):
+    """Returns the stored analysis for a query, or None if there isn't one."""
+    # `version` is part of the key, so editing the schema or prompt invalidates old entries.
+    return _analysis_store().get((user_query, schema["name"], schema["version"]))
+
+def _remember_analysis(user_query: str, schema: dict, result: dict):
+    """Stores a successful analysis so later lookups for the query hit."""
+    _analysis_store().put((user_query, schema["name"], schema["version"]), result)
+
+def _call_gemini(user_query: str, schema_name: str, version: str) -> dict:
+    """
+    Streams the Gemini analysis, rendering the description as it arrives.
+
+    Callers store the result with _remember_analysis; failures raise instead of
+    returning, so they are never stored.
+    """
+    api_url = f"{_API_BASE}/models/{_GEMINI_MODEL}:streamGenerateContent?alt=sse"
+    body = _build_body(user_query, schema_name, version)
+
+    buffer = []
+    with contextlib.closing(_post(api_url, body, stream=True)) as response:
+        response.raise_for_status()  # Raises an HTTPError for bad responses (4XX or 5XX)
+        # The description from the AI already uses markdown for bolding (**field**),
+        # so Streamlit can render it directly.
+        description = st.write_stream(_description_deltas(_stream_text(response), buffer))
+
+    result = _parse_analysis("".join(buffer))
+    if not description:
+        st.markdown(result.get("description", "No description provided."))
+    return result
+
+async def _call_gemini_async(client: httpx.AsyncClient, api_url: str, body: bytes) -> dict:
+    """Sends one non-streaming generateContent request on a shared async client."""
+    content = gzip.compress(body)
+    for attempt in range(_MAX_RETRIES + 1):
+        response = await client.post(api_url, content=content)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            break
+        await asyncio.sleep(_backoff(attempt))
+    response.raise_for_status()
+    result = _json_loads(response.content)
+
+    try:
+        _validate_response(result)
+    except fastjsonschema.JsonSchemaException as e:
+        raise ResponseFormatError(e.message, result) from e
+    _check_finish_reason(result["candidates"][0], result)
+    return _parse_analysis(result["candidates"][0]["content"]["parts"][0]["text"], result)
+
+async def _call_gemini_many(user_queries: list, schema_name: str, version: str) -> list:
+    """
+    Analyzes all queries concurrently, multiplexed over one HTTP/2 connection.
+
+    Returns one entry per query, either the analysis or the exception it raised.
+    """
+    api_url = f"{_API_BASE}/models/{_GEMINI_MODEL}:generateContent"
+    bodies = [_build_body(query, schema_name, version) for query in user_queries]
+
+    transport = httpx.AsyncHTTPTransport(http2=True, retries=2, limits=httpx.Limits(max_connections=8))
+    async with httpx.AsyncClient(timeout=_TIMEOUT, transport=transport, headers=_request_headers()) as client:
+        return await asyncio.gather(
+            *[_call_gemini_async(client, api_url, body) for body in bodies],
+            return_exceptions=True,
+        )
+
+def _has_api_key() -> bool:
+    """Checks that the API key is configured, rendering an error if it isn't."""
+    # For deployment, it's crucial to use st.secrets for your API key
+    if st.secrets.get("GEMINI_API_KEY", ""):
+        return True
+    st.error("GEMINI_API_KEY is not set in Streamlit secrets. The app cannot function without it. Please add it to your .streamlit/secrets.toml file.", icon="🚨")
+    return False
+
+def _report_error(e: Exception, prefix: str = ""):
+    """Renders the error message for a failed analysis."""
+    if isinstance(e, httpx.HTTPError):
+        st.error(f"{prefix}Network error calling the API: {e}")
+    elif isinstance(e, ValueError):
+        st.error(f"{prefix}Error parsing the API response: {e}. The AI might have returned an unexpected format.")
+        response = getattr(e, "response", None)
+        if response is None:
+            st.code("No response object available.")
+        elif isinstance(response, str):
+            # Raw model text, usually the malformed JSON itself; st.json would try to parse it.
+            st.code(response)
+        else:
+            st.json(response)
+    else:
+        st.error(f"{prefix}An unexpected error occurred: {e}")
+
+def _touches_schema(user_query: str, schema: dict) -> bool:
+    """Cheap local check for whether a query mentions anything in the schema."""
+    return not schema["keywords"].isdisjoint(_WORD.findall(user_query.lower()))
+
+def _no_impact_analysis() -> dict:
+    # `local` marks the canned answer so the UI doesn't attribute it to the AI.
+    return {"description": _NO_IMPACT_DESCRIPTION, "impact": [], "local": True}
+
+def analyze_action_with_ai(user_query: str, schema: dict):
+    """
+    Analyzes the user's action against the DB schema, rendering any errors.
+    """
+    if not _touches_schema(user_query, schema):
+        st.markdown(_NO_IMPACT_DESCRIPTION)
+        return _no_impact_analysis()
+
+    cached = _cached_analysis(user_query, schema)
+    if cached is not None:
+        st.markdown(cached.get("description", "No description provided."))
+        return cached
+
+    if not _has_api_key():
+        return None
+
+    try:
+        result = _call_gemini(user_query, schema["name"], schema["version"])
     except Exception as e:
-        st.error(f"An unexpected error occurred: {e}")
-        
-    return None
+        _report_error(e)
+        return None
+    _remember_analysis(user_query, schema, result)
+    return result
+
+def analyze_actions_with_ai(user_queries: list, schema: dict) -> list:
+    """
+    Analyzes several actions concurrently, rendering any errors.
+
+    Returns one entry per query, None where the analysis failed. Only queries
+    missing from the analysis store are sent to the API.
+    """
+    results = [_cached_analysis(query, schema) if _touches_schema(query, schema) else _no_impact_analysis() for query in user_queries]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if not pending or not _has_api_key():
+        return results
+
+    try:
+        outcomes = asyncio.run(_call_gemini_many([user_queries[i] for i in pending], schema["name"], schema["version"]))
+    except Exception as e:
+        _report_error(e)
+        return results
+
+    for i, outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            _report_error(outcome, prefix=f'"{user_queries[i]}": ')
+        else:
+            results[i] = outcome
+            _remember_analysis(user_queries[i], schema, outcome)
+    return results
 
 # --- UI Helper Functions ---
+_BADGE_TEMPLATE = '<span style="background-color: {bg_color}; color: {text_color}; font-size: 0.75rem; font-weight: 600; padding: 4px 8px; border-radius: 9999px; float: right;">{op}</span>'
+_BADGE_COLORS = {
+    "READ": ("#e0f2fe", "#0284c7"),    # Tailwind sky-100, sky-600
+    "WRITE": ("#d1fae5", "#059669"),   # Tailwind emerald-100, emerald-600
+    "DELETE": ("#fee2e2", "#dc2626"),  # Tailwind red-100, red-600
+}
+_BADGE_DEFAULT_COLORS = ("#e5e7eb", "#4b5563")  # gray-200, gray-600
+
+_FIELD_PRE = '<span style="background-color: #f3f4f6; color: #1f2937; font-family: monospace; font-size: 0.875rem; padding: 2px 6px; border-radius: 4px; margin: 2px 4px 2px 0;">'
+_FIELD_POST = '</span>'
+_IMPACT_TEMPLATE = '<div style="border: 1px solid #e5e7eb; border-radius: 8px; padding: 12px 16px; margin: 8px 0;"><h4>{table} {badge}</h4><p style="color: #6b7280; font-size: 0.875rem;">{reason}</p>{fields_html}</div>'
+
+# Only a handful of operations exist, so their badges are rendered once up front.
+_BADGE_HTML = {
+    op: _BADGE_TEMPLATE.format(bg_color=bg_color, text_color=text_color, op=op)
+    for op, (bg_color, text_color) in _BADGE_COLORS.items()
+}
+
 def get_operation_badge(operation):
     """Generates an HTML badge for the operation type."""
     op = operation.upper()
-    colors = {
-        "READ": ("#e0f2fe", "#0284c7"),    # Tailwind sky-100, sky-600
-        "WRITE": ("#d1fae5", "#059669"),   # Tailwind emerald-100, emerald-600
-        "DELETE": ("#fee2e2", "#dc2626"),  # Tailwind red-100, red-600
-    }
-    bg_color, text_color = colors.get(op, ("#e5e7eb", "#4b5563")) # gray-200, gray-600
-    
-    return f'<span style="background-color: {bg_color}; color: {text_color}; font-size: 0.75rem; font-weight: 600; padding: 4px 8px; border-radius: 9999px; float: right;">{op}</span>'
+    badge = _BADGE_HTML.get(op)
+    if badge is None:
+        bg_color, text_color = _BADGE_DEFAULT_COLORS
+        badge = _BADGE_TEMPLATE.format(bg_color=bg_color, text_color=text_color, op=html.escape(op))
+    return badge
+
+def render_impacts(analysis_result):
+    """Renders the affected collections and fields of an analysis."""
+    st.subheader("Affected Collections & Fields")
+
+    impacts = analysis_result.get("impact", [])
+    if analysis_result.get("local"):
+        st.info("This action doesn't mention any collection or field in the schema, so it wasn't sent to the AI. Name the data involved to get a full analysis.")
+        return
+    if not impacts:
+        st.info("The AI determined this action has no direct impact on the database.")
+        return
+
+    # All impact cards go out as one HTML element rather than several Streamlit
+    # elements per impact. Values come from the model, so they're escaped first.
+    cards = []
+    for item in impacts:
+        fields = item.get("fields", [])
+        fields_html = _FIELD_POST.join([_FIELD_PRE + html.escape(str(field)) for field in fields]) + _FIELD_POST if fields else ""
+        cards.append(_IMPACT_TEMPLATE.format(
+            table=html.escape(str(item.get("table", "N/A"))),
+            badge=get_operation_badge(item.get("operation", "N/A")),
+            reason=html.escape(str(item.get("reason", "No reason provided."))),
+            fields_html=fields_html,
+        ))
+    st.markdown("".join(cards), unsafe_allow_html=True)
+
+def render_analysis(query, analysis_result):
+    """Renders a complete analysis that isn't being streamed in."""
+    st.header(f'Analysis for: "{query}"', divider='rainbow')
+    st.markdown(analysis_result.get("description", "No description provided."))
+    render_impacts(analysis_result)
+
+# --- Schema Selection ---
+# One deployment serves every schema in schemas/; pick one with ?schema=<name>.
+requested_schema = st.query_params.get("schema", _DEFAULT_SCHEMA)
+schema_name = requested_schema if requested_schema in available_schemas() else _DEFAULT_SCHEMA
+schema = load_schema(schema_name)
+
+# --- Page Configuration ---
+st.set_page_config(
+    page_title=f"{schema['app_name']} - AI Database Action Analyzer",
+    page_icon=schema["page_icon"],
+    layout="wide"
+)
 
 # --- Main App Interface ---
-st.title("🏪 10D Stores - AI Database Action Analyzer")
-st.markdown("Describe any user action related to the 10D Stores app, and the AI will analyze its impact on the Firestore database schema.")
+if schema_name != requested_schema:
+    st.warning(f'Unknown schema "{requested_schema}", showing "{schema_name}" instead. Available: {", ".join(available_schemas())}.')
+
+st.title(f"{schema['page_icon']} {schema['app_name']} - AI Database Action Analyzer")
+st.markdown(f"Describe any user action related to the {schema['app_name']} app, and the AI will analyze its impact on the Firestore database schema.")
 
 st.markdown("---")
 
 # Input section
 action_input = st.text_area(
     "**Describe the User Action**",
-    placeholder="e.g., A customer redeems a 20% off offer at a restaurant, A business owner creates a new discount offer, A user leaves a review after redeeming an offer",
+    placeholder=schema["placeholder"],
     height=100,
     key="action_input"
 )
 
+batch_mode = st.toggle("Batch mode: analyze each line as a separate action", key="batch_mode")
+
 analyze_button = st.button("Analyze Action", type="primary", use_container_width=True)
 
 # Results section
-if analyze_button and action_input:
+# Streamlit reruns the whole script on every interaction, so the last results are
+# kept in session state to survive reruns that aren't the Analyze click.
+if analyze_button and action_input and batch_mode:
+    queries = list(dict.fromkeys(line.strip() for line in action_input.splitlines() if line.strip()))
+    with st.spinner(f"Analyzing {len(queries)} actions... This may take a moment."):
+        batch_results = analyze_actions_with_ai(queries, schema)
+
+    analyses = [(query, result) for query, result in zip(queries, batch_results) if result]
+    st.session_state["last_analysis"] = {"schema": schema_name, "query": action_input, "results": analyses}
+    for query, result in analyses:
+        st.markdown("---")
+        render_analysis(query, result)
+elif analyze_button and action_input:
+    st.markdown("---")
+    st.header(f'Analysis for: "{action_input}"', divider='rainbow')
+
+    # The description is streamed in by the API call itself.
     with st.spinner("Analyzing your action... This may take a moment."):
-        analysis_result = analyze_action_with_ai(action_input)
+        analysis_result = analyze_action_with_ai(action_input, schema)
     
     if analysis_result:
+        st.session_state["last_analysis"] = {"schema": schema_name, "query": action_input, "results": [(action_input, analysis_result)]}
+        render_impacts(analysis_result)
+    else:
+        st.session_state.pop("last_analysis", None)
+elif (cached := st.session_state.get("last_analysis")) and (cached["schema"], cached["query"]) == (schema_name, action_input):
+    for query, result in cached["results"]:
         st.markdown("---")
-        st.header(f'Analysis for: "{action_input}"', divider='rainbow')
-        
-        # The description from the AI already uses markdown for bolding (**field**), 
-        # so Streamlit's st.markdown can render it directly.
-        st.markdown(analysis_result.get("description", "No description provided."))
-
-        st.subheader("Affected Collections & Fields")
-        
-        impacts = analysis_result.get("impact", [])
-        if not impacts:
-            st.info("The AI determined this action has no direct impact on the database.")
-        else:
-            for item in impacts:
-                with st.container(border=True):
-                    st.markdown(f'<h4>{item.get("table", "N/A")} {get_operation_badge(item.get("operation", "N/A"))}</h4>', unsafe_allow_html=True)
-                    st.caption(item.get("reason", "No reason provided."))
-                    
-                    fields = item.get("fields", [])
-                    if fields:
-                        # Display fields as styled tags using HTML in markdown
-                        fields_html = "".join([f'<span style="background-color: #f3f4f6; color: #1f2937; font-family: monospace; font-size: 0.875rem; padding: 2px 6px; border-radius: 4px; margin: 2px 4px 2px 0;">{field}</span>' for field in fields])
-                        st.markdown(fields_html, unsafe_allow_html=True)
-                    
+        render_analysis(query, result)
 elif not st.session_state.get("action_input"):
     st.info("Enter an action above and click 'Analyze' to see the results.")